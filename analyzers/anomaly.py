@@ -3,7 +3,8 @@ Anomaly Detector — Statistical anomaly detection for AEOS access events.
 
 Uses Z-score analysis to identify unusual patterns in:
 - Hourly event volumes (spikes or drops)
-- Individual user activity (unusual badge usage by CarrierId/CarrierFullName)
+- Individual user activity (unusual badge usage by CarrierId/CarrierFullName,
+  scored with a robust median/MAD Z-score)
 - Off-hours access (events outside business hours)
 
 Column names follow the AEOS WSDL EventInfo schema:
@@ -12,61 +13,113 @@ Column names follow the AEOS WSDL EventInfo schema:
 
 import pandas as pd
 import numpy as np
+from numba import njit
+
+# Event columns reported by detect_off_hours_access (plus "Reason").
+OFF_HOURS_COLUMNS = [
+    "DateTime", "CarrierId", "CarrierFullName", "Identifier",
+    "AccesspointName", "EventTypeName", "Granted",
+]
 
 
 class AnomalyDetector:
     """Detect anomalies in AEOS access event data using statistical methods."""
 
-    def __init__(self, df: pd.DataFrame, z_threshold: float = 2.0):
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        z_threshold: float = 2.0,
+        hourly_counts: pd.DataFrame = None,
+    ):
+        """
+        Args:
+            df: Event DataFrame from `load_events`. May be None when only
+                `detect_hourly_anomalies` is used, with `hourly_counts`.
+            z_threshold: Z-score above which a value is flagged.
+            hourly_counts: Optional Date/Hour/Count frame pre-aggregated by
+                `load_hourly_counts`; used instead of grouping `df` in
+                `detect_hourly_anomalies`.
+        """
         self.df = df
         self.z_threshold = z_threshold
+        self.hourly_counts = hourly_counts
 
-    def detect_hourly_anomalies(self) -> pd.DataFrame:
+    def detect_all(
+        self,
+        window: int = None,
+        start_hour: int = 7,
+        end_hour: int = 20,
+        exclude_weekends: bool = True,
+    ) -> tuple:
         """
-        Find hours with unusually high or low event counts.
+        Run the hourly, user and off-hours detections together.
 
-        Groups events by date+hour, computes Z-scores, and flags
-        any hour that deviates more than `z_threshold` standard deviations.
+        Equivalent to calling the three `detect_*` methods, but the hour
+        bucket counts and the off-hours / weekend flags all come from one
+        compiled pass over the DateHourKey column instead of a groupby plus
+        separate reads of Hour and DayOfWeek.
+
+        Returns:
+            (hourly_anomalies, user_anomalies, off_hours_access)
         """
-        hourly = (
-            self.df.groupby([self.df["DateTime"].dt.date, "Hour"])
-            .size()
-            .reset_index(name="count")
+        key = self.df["DateHourKey"].to_numpy()
+        first = key.min() if len(key) else 0
+        n_buckets = key.max() - first + 1 if len(key) else 0
+        counts, mask, is_weekend = _scan_hours(
+            key, first, n_buckets, start_hour, end_hour, exclude_weekends
         )
-        hourly.columns = ["Date", "Hour", "Count"]
 
-        mean = hourly["Count"].mean()
-        std = hourly["Count"].std()
-        if std == 0:
-            hourly["z_score"] = 0.0
+        if self.hourly_counts is not None:
+            hourly = self._hourly_counts()
         else:
-            hourly["z_score"] = ((hourly["Count"] - mean) / std).round(2)
+            hourly = _hour_buckets(first, counts)
+        return (
+            self._score_hours(hourly, window),
+            self.detect_user_anomalies(),
+            self._off_hours(mask, is_weekend),
+        )
 
-        anomalies = hourly[hourly["z_score"].abs() > self.z_threshold].copy()
-        anomalies["direction"] = np.where(anomalies["z_score"] > 0, "SPIKE", "DROP")
-        return anomalies.sort_values("z_score", ascending=False)
+    def detect_hourly_anomalies(self, window: int = None) -> pd.DataFrame:
+        """
+        Find hours with unusually high or low event counts.
+
+        Groups events by date+hour (or uses the pre-aggregated
+        `hourly_counts`), computes Z-scores, and flags any hour that
+        deviates more than `z_threshold` standard deviations.
+
+        Args:
+            window: Optional trailing window in hours (e.g. 168 for one
+                week). Each hour is then scored against the rolling mean/std
+                of that window instead of the whole period, which catches
+                structural shifts. Hours with fewer than min(window, 24)
+                buckets of history get no score.
+        """
+        return self._score_hours(self._hourly_counts(), window)
 
     def detect_user_anomalies(self) -> pd.DataFrame:
         """
         Find users with unusually high daily event counts.
 
         Groups by Date + CarrierId/CarrierFullName (AEOS carrier identifiers),
-        then flags users whose daily usage deviates more than `z_threshold`
-        standard deviations above the mean.
+        then flags users whose robust Z-score exceeds `z_threshold`. The score
+        uses the median and median absolute deviation (MAD) of the daily
+        counts instead of mean/std, so the heavy users being looked for don't
+        inflate the baseline they are measured against.
         """
         daily_user = (
-            self.df.groupby(["Date", "CarrierId", "CarrierFullName"])
+            self.df.groupby(
+                ["Date", "CarrierId", "CarrierFullName"], observed=True, sort=False
+            )
             .size()
             .reset_index(name="DailyCount")
         )
 
-        mean = daily_user["DailyCount"].mean()
-        std = daily_user["DailyCount"].std()
-        if std == 0:
+        z = _robust_z_scores(daily_user["DailyCount"].to_numpy(dtype=np.float64))
+        if len(z) == 0:
             return pd.DataFrame()
 
-        daily_user["z_score"] = ((daily_user["DailyCount"] - mean) / std).round(2)
-        anomalies = daily_user[daily_user["z_score"] > self.z_threshold].copy()
+        daily_user["z_score"] = z.round(2)
+        anomalies = daily_user[daily_user["z_score"] > self.z_threshold]
         return anomalies.sort_values("z_score", ascending=False)
 
     def detect_off_hours_access(
@@ -80,19 +133,137 @@ class AnomalyDetector:
             end_hour: Business hours end (default: 20:00).
             exclude_weekends: If True, all weekend events are flagged.
         """
-        mask = (self.df["Hour"] < start_hour) | (self.df["Hour"] >= end_hour)
+        hour = self.df["Hour"].to_numpy()
+        is_weekend = self.df["DayOfWeek"].to_numpy() >= 5
 
+        mask = (hour < start_hour) | (hour >= end_hour)
         if exclude_weekends:
-            weekend = self.df["DayOfWeek"].isin(["Saturday", "Sunday"])
-            mask = mask | weekend
-
-        off_hours = self.df[mask].copy()
-        off_hours["Reason"] = "Off-hours access"
-        off_hours.loc[
-            off_hours["DayOfWeek"].isin(["Saturday", "Sunday"]), "Reason"
-        ] = "Weekend access"
-
-        return off_hours[
-            ["DateTime", "CarrierId", "CarrierFullName", "Identifier",
-             "AccesspointName", "EventTypeName", "Granted", "Reason"]
-        ].sort_values("DateTime", ascending=False)
+            mask |= is_weekend
+        return self._off_hours(mask, is_weekend)
+
+    def _hourly_counts(self) -> pd.DataFrame:
+        """
+        Date/Hour/Count per non-empty hour bucket, taken from `hourly_counts`
+        when given, otherwise counted from the DateHourKey column.
+        """
+        if self.hourly_counts is not None:
+            return self.hourly_counts[["Date", "Hour", "Count"]].copy()
+
+        key = self.df["DateHourKey"].to_numpy()
+        first = key.min() if len(key) else 0
+        return _hour_buckets(first, np.bincount(key - first))
+
+    def _score_hours(self, hourly: pd.DataFrame, window: int = None) -> pd.DataFrame:
+        """Z-score each hour bucket's Count and keep those past the threshold."""
+        if window:
+            # Time-based window, so hours without any event don't shift it
+            hourly = hourly.sort_values(["Date", "Hour"], ignore_index=True)
+            when = pd.DatetimeIndex(hourly["Date"]) + pd.to_timedelta(hourly["Hour"], unit="h")
+            rolling = hourly["Count"].set_axis(when).rolling(
+                f"{window}h", min_periods=min(window, 24)
+            )
+            mean = rolling.mean().to_numpy()
+            std = rolling.std().to_numpy()
+            std[std == 0] = np.nan
+            hourly["z_score"] = ((hourly["Count"].to_numpy() - mean) / std).round(2)
+        else:
+            z = _z_scores(hourly["Count"].to_numpy(dtype=np.float64))
+            hourly["z_score"] = z.round(2)
+
+        anomalies = hourly[hourly["z_score"].abs() > self.z_threshold]
+        return anomalies.assign(
+            direction=np.where(anomalies["z_score"] > 0, "SPIKE", "DROP")
+        ).sort_values("z_score", ascending=False)
+
+    def _off_hours(self, mask: np.ndarray, is_weekend: np.ndarray) -> pd.DataFrame:
+        """The events selected by `mask` with their Reason, newest first."""
+        # Newest first; take only the reported rows and columns, in one copy
+        idx = np.flatnonzero(mask)
+        times = self.df["DateTime"].to_numpy()[idx]
+        idx = idx[np.argsort(times, kind="stable")[::-1]]
+
+        off_hours = self.df.iloc[idx, self.df.columns.get_indexer(OFF_HOURS_COLUMNS)]
+        off_hours.insert(
+            len(OFF_HOURS_COLUMNS),
+            "Reason",
+            np.select([is_weekend[idx]], ["Weekend access"], default="Off-hours access"),
+        )
+        return off_hours
+
+
+def _hour_buckets(first: int, counts: np.ndarray) -> pd.DataFrame:
+    """Date/Hour/Count frame of the non-zero `counts`, bucket 0 = key `first`."""
+    buckets = np.flatnonzero(counts)
+    key = first + buckets
+    return pd.DataFrame({
+        "Date": (key // 24).astype("datetime64[D]"),
+        "Hour": key % 24,
+        "Count": counts[buckets],
+    })
+
+
+@njit(cache=True, nogil=True)
+def _scan_hours(keys, first, n_buckets, start_hour, end_hour, exclude_weekends):
+    """
+    One pass over DateHourKey values, counting events per hour bucket and
+    flagging off-hours events.
+
+    Returns (counts, mask, is_weekend): `counts[k - first]` events in bucket
+    k, and per event whether it falls outside [start_hour, end_hour) (or on
+    a weekend, with `exclude_weekends`) and whether it is on a weekend.
+    Serial on purpose: a parallel loop would race on the shared counters.
+    """
+    counts = np.zeros(n_buckets, dtype=np.int64)
+    mask = np.empty(len(keys), dtype=np.bool_)
+    is_weekend = np.empty(len(keys), dtype=np.bool_)
+
+    for i in range(len(keys)):
+        key = keys[i]
+        counts[key - first] += 1
+        hour = key % 24
+        # 1970-01-01 was a Thursday (weekday 3 with Monday=0)
+        weekend = (key // 24 + 3) % 7 >= 5
+        is_weekend[i] = weekend
+        mask[i] = hour < start_hour or hour >= end_hour or (exclude_weekends and weekend)
+
+    return counts, mask, is_weekend
+
+
+@njit(cache=True, nogil=True)
+def _z_scores(counts):
+    """
+    Standard Z-scores of `counts` against their mean and sample std.
+
+    All zeros when every count is equal; NaN with fewer than two counts.
+    """
+    n = len(counts)
+    if n < 2:
+        return np.full(n, np.nan)
+    mean = counts.mean()
+    std = np.sqrt(((counts - mean) ** 2).sum() / (n - 1))
+    if std == 0:
+        return np.zeros(n)
+    return (counts - mean) / std
+
+
+@njit(cache=True, nogil=True)
+def _robust_z_scores(counts):
+    """
+    Robust Z-scores of `counts` from the median and MAD.
+
+    Returns an empty array when there is no spread to score against (or no
+    counts at all).
+    """
+    if len(counts) == 0:
+        return np.empty(0)
+    median = np.median(counts)
+    deviation = np.abs(counts - median)
+    mad = np.median(deviation)
+    if mad > 0:
+        return 0.6745 * (counts - median) / mad
+    # Over half the user-days share one count: scale by the mean absolute
+    # deviation instead (1.2533 = sqrt(pi/2)).
+    mean_ad = deviation.mean()
+    if mean_ad == 0:
+        return np.empty(0)
+    return (counts - median) / (1.2533 * mean_ad)
@@ -14,12 +14,26 @@ The `Granted` boolean is derived from EventTypeName:
   - Other events       →  NaN (excluded from grant/deny analysis)
 """
 
+import hashlib
+import logging
 import os
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
+from urllib.parse import quote
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import pyodbc
 
+try:
+    import connectorx as cx
+except ImportError:  # optional, falls back to pyodbc + pandas.read_sql
+    cx = None
+
+logger = logging.getLogger(__name__)
+
 
 def get_connection_string() -> str:
     """Build ODBC connection string from environment variables."""
@@ -41,6 +55,25 @@ def get_connection_string() -> str:
     )
 
 
+def get_connection_url() -> str:
+    """Build a connectorx mssql:// URL from the same environment variables."""
+    server = os.getenv("DB_SERVER", "localhost").replace(",", ":")
+    database = os.getenv("DB_NAME", "aeosdb")
+    trusted = os.getenv("DB_TRUSTED_CONNECTION", "no").lower() in ("yes", "true", "1")
+
+    if trusted:
+        return (
+            f"mssql://{server}/{database}"
+            f"?trusted_connection=true&trust_server_certificate=true"
+        )
+    user = quote(os.getenv("DB_USER", ""), safe="")
+    password = quote(os.getenv("DB_PASSWORD", ""), safe="")
+    return (
+        f"mssql://{user}:{password}@{server}/{database}"
+        f"?trust_server_certificate=true"
+    )
+
+
 # ---------------------------------------------------------------------------
 # SQL Query — vw_AeosEventLog (AEOS WSDL EventInfo column naming)
 # ---------------------------------------------------------------------------
@@ -52,6 +85,7 @@ def get_connection_string() -> str:
 
 EVENTS_QUERY = """
 SELECT
+    ev.Id,
     ev.[DateTime],
     ev.EventTypeName,
     ev.AccesspointId,
@@ -69,6 +103,86 @@ WHERE ev.[DateTime] >= ?
 ORDER BY ev.[DateTime];
 """
 
+# EVENTS_QUERY for partitioned connectorx reads, which wrap the query in a
+# subquery per Id range: SQL Server rejects ORDER BY (and `;`) there, so
+# load_events restores time order after the fetch instead.
+EVENTS_PARTITION_QUERY = EVENTS_QUERY.replace("ORDER BY ev.[DateTime];", "")
+
+# Events per date and hour, aggregated server-side. Used as the baseline for
+# hourly anomaly detection without transferring the raw event rows.
+HOURLY_COUNTS_QUERY = """
+SELECT
+    CAST(ev.[DateTime] AS date)   AS [Date],
+    DATEPART(hour, ev.[DateTime]) AS [Hour],
+    COUNT(*)                      AS [Count]
+FROM dbo.vw_AeosEventLog ev WITH (NOLOCK)
+WHERE ev.[DateTime] >= ?
+  AND ev.[DateTime] <  ?
+GROUP BY CAST(ev.[DateTime] AS date), DATEPART(hour, ev.[DateTime])
+ORDER BY [Date], [Hour];
+"""
+
+# Total / granted / denied counts per hour of day, date, access point and
+# user, aggregated server-side for the traffic report (`load_aggregates`).
+# Granted/denied follow `_classify_granted`; other event types are counted
+# in total only, and rows with a missing key are left out like in a groupby.
+_GRANT_COUNTS = """
+    COUNT(*) AS total,
+    SUM(CASE WHEN LTRIM(ev.EventTypeName) LIKE 'Access granted%' THEN 1 ELSE 0 END) AS granted,
+    SUM(CASE WHEN LTRIM(ev.EventTypeName) LIKE 'Access denied%' THEN 1 ELSE 0 END) AS denied
+FROM dbo.vw_AeosEventLog ev WITH (NOLOCK)
+WHERE ev.[DateTime] >= ?
+  AND ev.[DateTime] <  ?"""
+
+AGGREGATE_QUERIES = {
+    "hour": f"""
+SELECT
+    DATEPART(hour, ev.[DateTime]) AS [Hour],{_GRANT_COUNTS}
+GROUP BY DATEPART(hour, ev.[DateTime])
+ORDER BY [Hour];
+""",
+    "date": f"""
+SELECT
+    CAST(ev.[DateTime] AS date) AS [Date],{_GRANT_COUNTS}
+GROUP BY CAST(ev.[DateTime] AS date)
+ORDER BY [Date];
+""",
+    "access_point": f"""
+SELECT
+    ev.AccesspointName,{_GRANT_COUNTS}
+  AND ev.AccesspointName IS NOT NULL
+GROUP BY ev.AccesspointName;
+""",
+    "user": f"""
+SELECT
+    ev.CarrierId,
+    ev.CarrierFullName,
+    ev.Identifier,{_GRANT_COUNTS}
+  AND ev.CarrierId IS NOT NULL
+  AND ev.CarrierFullName IS NOT NULL
+  AND ev.Identifier IS NOT NULL
+GROUP BY ev.CarrierId, ev.CarrierFullName, ev.Identifier;
+""",
+}
+
+# Rows fetched per round-trip when streaming EVENTS_QUERY.
+CHUNK_SIZE = 200_000
+
+NS_PER_HOUR = 3_600_000_000_000
+
+# Columns stored as pandas Categoricals after loading.
+CATEGORICAL_COLUMNS = (
+    "AccesspointName",
+    "EntranceName",
+    "CarrierId",
+    "CarrierFullName",
+    "Identifier",
+    "HostName",
+)
+
+# Integer id columns, downcast to the smallest integer type that fits.
+ID_COLUMNS = ("Id", "AccesspointId", "EntranceId", "IdentifierId")
+
 
 def load_events(days: int = 30) -> pd.DataFrame:
     """
@@ -79,33 +193,282 @@ def load_events(days: int = 30) -> pd.DataFrame:
 
     Returns:
         DataFrame with AEOS EventInfo columns plus derived fields:
-        - Granted (bool): True for "Access granted*", False for "Access denied*"
-        - Hour (int): Hour of day (0-23)
-        - DayOfWeek (str): Day name
-        - Date: Date part of DateTime
+        - Granted (boolean): True for "Access granted*", False for
+          "Access denied*", <NA> for other event types
+        - Hour (int8): Hour of day (0-23)
+        - DayOfWeek (int8): Day of week, Monday=0 ... Sunday=6
+        - Date (datetime64): DateTime truncated to midnight
+        - DateHourKey (int64): Hours since epoch (days * 24 + Hour), a
+          single-column key for per-date-and-hour grouping
+
+        Rows are in DateTime order. Key string columns are Categoricals and
+        id columns use the smallest integer type that holds them.
     """
-    end = datetime.utcnow()
-    start = end - timedelta(days=days)
+    logger.info("Loading access events from SQL Server...")
+    start, end = _time_window(days)
+
+    if cx is not None:
+        # connectorx decodes rows straight into Arrow buffers, skipping the
+        # per-row Python tuples built by pyodbc, and fetches DB_PARTITIONS
+        # Id ranges over parallel connections.
+        partitions = int(os.getenv("DB_PARTITIONS", "4"))
+        if partitions > 1:
+            df = _read_arrow(
+                EVENTS_PARTITION_QUERY, [start, end], partition_on="Id", partition_num=partitions
+            )
+        else:
+            df = _read_arrow(EVENTS_QUERY, [start, end])
+        chunks = [_derive_time_fields(df)]
+    else:
+        # Stream the result in chunks with Arrow-backed dtypes: string columns
+        # stay in contiguous Arrow buffers instead of one Python object per cell.
+        conn = pyodbc.connect(get_connection_string(), timeout=30)
+        try:
+            chunks = [
+                _derive_time_fields(chunk)
+                for chunk in pd.read_sql(
+                    EVENTS_QUERY,
+                    conn,
+                    params=[start, end],
+                    chunksize=CHUNK_SIZE,
+                    dtype_backend="pyarrow",
+                )
+            ]
+        finally:
+            conn.close()
 
-    conn = pyodbc.connect(get_connection_string(), timeout=30)
-    try:
-        df = pd.read_sql(EVENTS_QUERY, conn, params=[start, end])
-    finally:
-        conn.close()
+    if not chunks:
+        return pd.DataFrame()
+    df = pd.concat(chunks, ignore_index=True)
 
-    if "DateTime" in df.columns:
-        df["DateTime"] = pd.to_datetime(df["DateTime"])
-        df["Hour"] = df["DateTime"].dt.hour
-        df["DayOfWeek"] = df["DateTime"].dt.day_name()
-        df["Date"] = df["DateTime"].dt.date
+    # The query orders by DateTime; make sure, since the analyzers exploit
+    # time order (a stable sort keeps any tie order from the server).
+    if "DateTime" in df.columns and not df["DateTime"].is_monotonic_increasing:
+        df = df.sort_values("DateTime", kind="stable", ignore_index=True)
 
-    # Derive Granted boolean from AEOS EventTypeName
+    _categorize(df)
+    for col in ID_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+
+    # Derive Granted boolean from AEOS EventTypeName. There are only a
+    # handful of distinct event types, so classify the categories once and
+    # map the result onto the category codes.
     if "EventTypeName" in df.columns:
-        df["Granted"] = df["EventTypeName"].apply(_classify_granted)
+        df["EventTypeName"] = df["EventTypeName"].astype("category")
+        grant_map = {
+            c: _classify_granted(c) for c in df["EventTypeName"].cat.categories
+        }
+        df["Granted"] = df["EventTypeName"].map(grant_map).astype("boolean")
+
+    return df
+
+
+def load_cached_events(
+    days: int = 30, cache_dir: str = ".cache", refresh: bool = False
+) -> pd.DataFrame:
+    """
+    `load_events`, cached as Parquet under `cache_dir` for the current day.
+
+    The cache file is keyed by the source server and database, `days` and
+    today's date, so repeated runs on the same day skip the SQL Server
+    round-trip, and pointing `.env` at another database never reuses its
+    events. A cached snapshot holds the events up to when it was written;
+    pass `refresh=True` to re-query and overwrite it.
+    Empty results are not cached.
+    """
+    path = os.path.join(
+        cache_dir,
+        f"events_{_source_key()}_{days}d_{date.today().isoformat()}.parquet",
+    )
+
+    if os.path.exists(path) and not refresh:
+        # The snapshot's window ends when it was written: say so, since
+        # events after that are missing from this run.
+        written = os.path.getmtime(path)
+        logger.info(
+            "Using cached events from %s, written %s (%.0f min ago); "
+            "later events are not included, use --refresh-cache to re-query",
+            path,
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(written)),
+            (time.time() - written) / 60,
+        )
+        return _read_cached(path)
+
+    df = load_events(days)
+    if not df.empty:
+        # Write to a temporary name and swap it in, so an interrupted write
+        # never leaves a truncated cache file behind.
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(tmp_path, compression="zstd", index=False)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return df
+
+
+def load_hourly_counts(days: int = 30) -> pd.DataFrame:
+    """
+    Load per-date, per-hour event counts aggregated by SQL Server.
+
+    Args:
+        days: Number of past days to retrieve.
+
+    Returns:
+        DataFrame with columns Date (datetime64), Hour (int), Count (int),
+        suitable for `AnomalyDetector(hourly_counts=...)`.
+    """
+    start, end = _time_window(days)
 
+    if cx is not None:
+        df = _read_arrow(HOURLY_COUNTS_QUERY, [start, end])
+    else:
+        conn = pyodbc.connect(get_connection_string(), timeout=30)
+        try:
+            df = pd.read_sql(HOURLY_COUNTS_QUERY, conn, params=[start, end])
+        finally:
+            conn.close()
+
+    df["Date"] = pd.to_datetime(df["Date"])
     return df
 
 
+def load_aggregates(days: int = 30) -> dict:
+    """
+    Load the traffic summaries aggregated by SQL Server.
+
+    Transfers one row per hour, date, access point and user instead of one
+    per event, for runs that only need the traffic report.
+
+    Args:
+        days: Number of past days to retrieve.
+
+    Returns:
+        Dict mapping "hour", "date", "access_point" and "user" to DataFrames
+        of the key column(s) plus total / granted / denied counts, suitable
+        for `TrafficAnalyzer(summaries=...)`.
+    """
+    start, end = _time_window(days)
+
+    if cx is not None:
+        aggregates = {
+            name: _read_arrow(query, [start, end])
+            for name, query in AGGREGATE_QUERIES.items()
+        }
+    else:
+        conn = pyodbc.connect(get_connection_string(), timeout=30)
+        try:
+            aggregates = {
+                name: pd.read_sql(query, conn, params=[start, end])
+                for name, query in AGGREGATE_QUERIES.items()
+            }
+        finally:
+            conn.close()
+
+    aggregates["date"]["Date"] = pd.to_datetime(aggregates["date"]["Date"])
+    return aggregates
+
+
+def _read_arrow(query: str, params: list, **kwargs) -> pd.DataFrame:
+    """
+    Run `query` through connectorx and return Arrow-backed columns.
+
+    Extra keyword arguments (e.g. partition_on / partition_num) are passed
+    to `connectorx.read_sql`.
+    """
+    table = cx.read_sql(
+        get_connection_url(), _inline_params(query, params), return_type="arrow", **kwargs
+    )
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _inline_params(query: str, params: list) -> str:
+    """
+    Replace each `?` placeholder with a datetime literal.
+
+    connectorx has no bind parameters, so the query text must carry the
+    values. Only datetimes are accepted, formatted as ISO 8601.
+    """
+    for value in params:
+        if not isinstance(value, datetime):
+            raise TypeError(f"Only datetime parameters can be inlined, got {value!r}")
+        query = query.replace("?", f"'{value.isoformat(timespec='milliseconds')}'", 1)
+    return query
+
+
+def _read_cached(path: str) -> pd.DataFrame:
+    """
+    Read a `load_cached_events` file back into the frame `load_events` built.
+
+    Parquet only keeps string Categoricals dictionary-encoded, and pandas
+    decodes them with object categories; numeric keys such as CarrierId come
+    back as plain columns, integers with NULLs turned into float64. So the
+    key columns and EventTypeName are rebuilt from Arrow dictionaries with
+    Arrow-backed categories, as `load_events` makes them, and Date gets back
+    its seconds unit.
+    """
+    table = pq.read_table(path)
+    df = table.to_pandas()
+
+    for col in (*CATEGORICAL_COLUMNS, "EventTypeName"):
+        if col not in df.columns:
+            continue
+        column = table.column(col)
+        if not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column)
+        column = column.unify_dictionaries().combine_chunks()
+        categories = pd.Index(pd.array(column.dictionary, dtype=pd.ArrowDtype(column.dictionary.type)))
+        df[col] = pd.Categorical.from_codes(
+            pc.fill_null(column.indices, -1).to_numpy(),
+            dtype=pd.CategoricalDtype(categories),
+        )
+
+    if "Date" in df.columns:
+        df["Date"] = df["Date"].astype("datetime64[s]")
+    return df
+
+
+def _source_key() -> str:
+    """Short hash of DB_SERVER and DB_NAME (no credentials) for cache keys."""
+    server = os.getenv("DB_SERVER", "localhost")
+    database = os.getenv("DB_NAME", "aeosdb")
+    return hashlib.sha256(f"{server}/{database}".lower().encode()).hexdigest()[:12]
+
+
+def _time_window(days: int) -> tuple:
+    """Return the (start, end) UTC datetimes covering the past `days` days."""
+    end = datetime.utcnow()
+    return end - timedelta(days=days), end
+
+
+def _categorize(df: pd.DataFrame) -> None:
+    """Convert CATEGORICAL_COLUMNS to pandas Categoricals, in place."""
+    # Low-cardinality keys used by the analyzers' groupbys: hashing small
+    # integer codes is much cheaper than hashing strings.
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+
+def _derive_time_fields(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Add Hour / DayOfWeek / Date / DateHourKey to one chunk of raw events."""
+    if "DateTime" in chunk.columns:
+        chunk["DateTime"] = chunk["DateTime"].astype("datetime64[ns]")
+        # Derive every calendar field from the ns-since-epoch integers in one
+        # go instead of a separate .dt accessor pass per field.
+        hours = chunk["DateTime"].to_numpy().view("int64") // NS_PER_HOUR
+        days = hours // 24
+        chunk["Hour"] = (hours % 24).astype("int8")
+        # 1970-01-01 was a Thursday (weekday 3 with Monday=0)
+        chunk["DayOfWeek"] = ((days + 3) % 7).astype("int8")
+        chunk["Date"] = days.astype("datetime64[D]")
+        chunk["DateHourKey"] = hours
+    return chunk
+
+
 def _classify_granted(event_type_name: str) -> object:
     """
     Classify an AEOS EventTypeName into granted/denied.
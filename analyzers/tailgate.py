@@ -10,22 +10,28 @@ Column names follow the AEOS WSDL EventInfo schema:
     DateTime, EventTypeName, AccesspointName, CarrierId, CarrierFullName, Identifier
 """
 
+import numpy as np
 import pandas as pd
+from numba import njit, prange
 
 
 class TailgateAnalyzer:
     """Detect potential tailgating events from AEOS access logs."""
 
     def __init__(self, df: pd.DataFrame):
-        self.df = df.copy()
+        self.df = df
+        self._sorted = None
+        self._sorted_for = None
 
     def detect_rapid_follows(self, max_seconds: int = 3) -> pd.DataFrame:
         """
         Find events where two different carriers used the same access point
         within `max_seconds` of each other.
 
-        Only considers "Access granted" events (EventTypeName starting with
-        'Access granted'), since denied events don't open the door.
+        Only considers "Access granted" events (Granted is True, i.e.
+        EventTypeName starting with 'Access granted'), since denied events
+        don't open the door. The filtered and sorted events are cached, so
+        repeated calls (e.g. a `max_seconds` sweep) only re-run the scan.
 
         Args:
             max_seconds: Maximum time gap in seconds to flag as tailgating.
@@ -34,32 +40,117 @@ class TailgateAnalyzer:
             DataFrame with columns: DateTime, AccesspointName, Carrier1,
             Carrier2, GapSeconds.
         """
-        # Filter to granted events only (AEOS EventTypeName pattern)
-        granted = self.df[
-            self.df["EventTypeName"].str.lower().str.startswith("access granted", na=False)
-        ].copy()
-        granted = granted.sort_values(["AccesspointName", "DateTime"])
+        df = self.df
+        rows, times, carriers, starts, ends, label_codes, labels = self._granted_sorted
 
-        results = []
+        is_hit = np.zeros(len(rows), dtype=np.bool_)
+        _scan_rapid_follows(
+            starts, ends, times, carriers, int(max_seconds * 1_000_000_000), is_hit
+        )
+        hits = np.flatnonzero(is_hit)
+        second = rows[hits]
 
-        for ap_name, group in granted.groupby("AccesspointName"):
-            if len(group) < 2:
+        return pd.DataFrame({
+            "DateTime": df["DateTime"].to_numpy()[second],
+            "AccesspointName": df["AccesspointName"].iloc[second].to_numpy(),
+            "Carrier1": labels[label_codes[hits - 1]],
+            "Carrier2": labels[label_codes[hits]],
+            "GapSeconds": ((times[hits] - times[hits - 1]) / 1e9).round(1),
+        })
+
+    @property
+    def _granted_sorted(self) -> tuple:
+        """
+        Granted events sorted by (access point, time), built on first use.
+
+        Returns (rows, times, carriers, starts, ends, label_codes, labels):
+        positions into `self.df`, ns timestamps and carrier codes in sorted
+        order, the start/end offsets of each access point's slice, and the
+        "CarrierFullName [Identifier]" label of each event as
+        `labels[label_codes]`. Rebuilt whenever `self.df` is replaced.
+        """
+        if self._sorted is None or self._sorted_for is not self.df:
+            self._sorted = self._sort_granted()
+            self._sorted_for = self.df
+        return self._sorted
+
+    def _sort_granted(self) -> tuple:
+        df = self.df
+
+        # Positions of granted events only (Granted is derived from EventTypeName)
+        granted = np.flatnonzero(df["Granted"].to_numpy(dtype=bool, na_value=False))
+
+        times = df["DateTime"].to_numpy(dtype="datetime64[ns]").view("int64")[granted]
+        ap_codes = _codes(df["AccesspointName"])[granted]
+        carrier_codes = _codes(df["CarrierId"])[granted]
+
+        # Sort by (access point, time) and drop events without an access point.
+        # Events from load_events are already in time order, so a stable sort
+        # on the small access point codes alone is enough.
+        if np.all(times[1:] >= times[:-1]):
+            order = np.argsort(ap_codes, kind="stable")
+        else:
+            order = np.lexsort((times, ap_codes))
+        order = order[ap_codes[order] >= 0]
+
+        # Each access point is a contiguous slice of the sorted events
+        bounds = np.flatnonzero(np.diff(ap_codes[order])) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(order)]))
+
+        rows = granted[order]
+        label_codes, labels = _carrier_labels(
+            df["CarrierFullName"].iloc[rows], df["Identifier"].iloc[rows]
+        )
+        return (
+            rows, times[order], carrier_codes[order], starts, ends, label_codes, labels
+        )
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def _scan_rapid_follows(starts, ends, times, carriers, max_ns, is_hit):
+    """
+    Scan events sorted by (access point, time), one access point per thread.
+
+    `starts`/`ends` delimit each access point's slice. Sets `is_hit[i]` for
+    every event that follows a different carrier at the same access point
+    within `max_ns` nanoseconds. A missing carrier (code -1) never matches.
+    """
+    for g in prange(len(starts)):
+        for i in range(starts[g] + 1, ends[g]):
+            if carriers[i] == carriers[i - 1] and carriers[i] >= 0:
                 continue
+            gap = times[i] - times[i - 1]
+            if 0 < gap <= max_ns:
+                is_hit[i] = True
+
+
+def _codes(values: pd.Series) -> np.ndarray:
+    """Integer codes in sorted value order; missing values get -1."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy()
+    return pd.factorize(values, sort=True)[0]
+
+
+def _carrier_labels(names: pd.Series, identifiers: pd.Series) -> tuple:
+    """
+    Format carriers as "CarrierFullName [Identifier]" for the report.
+
+    Returns (codes, labels) with the label of event i at `labels[codes[i]]`,
+    building one string per distinct name/identifier pair, not per event.
+    """
+    name_codes = _codes(names).astype(np.int64)
+    id_codes = _codes(identifiers).astype(np.int64)
+    codes, _ = pd.factorize((name_codes + 1) * (id_codes.max(initial=0) + 2) + id_codes + 1)
+
+    # One representative event per pair
+    first = np.empty(codes.max(initial=-1) + 1, dtype=np.int64)
+    first[codes[::-1]] = np.arange(len(codes))[::-1]
 
-            times = group["DateTime"].values
-            carrier_ids = group["CarrierId"].values
-            names = group["CarrierFullName"].fillna("").values
-            identifiers = group["Identifier"].fillna("").values
-
-            for i in range(1, len(times)):
-                gap = (times[i] - times[i - 1]) / pd.Timedelta(seconds=1)
-                if 0 < gap <= max_seconds and carrier_ids[i] != carrier_ids[i - 1]:
-                    results.append({
-                        "DateTime": pd.Timestamp(times[i]),
-                        "AccesspointName": ap_name,
-                        "Carrier1": f"{names[i-1]} [{identifiers[i-1]}]",
-                        "Carrier2": f"{names[i]} [{identifiers[i]}]",
-                        "GapSeconds": round(gap, 1),
-                    })
-
-        return pd.DataFrame(results)
+    labels = (
+        names.iloc[first].astype("string").fillna("")
+        + " ["
+        + identifiers.iloc[first].astype("string").fillna("")
+        + "]"
+    )
+    return codes, labels.to_numpy(dtype=object)
@@ -3,48 +3,52 @@ Traffic Analyzer — Patterns and distributions in AEOS access events.
 
 Uses AEOS EventInfo column names:
     DateTime, EventTypeName, AccesspointName, CarrierFullName, Identifier
+
+All summaries come from a single pass over the events: one compiled loop
+fills total/granted/denied counters per hour, date, access point and user.
 """
 
+import numpy as np
 import pandas as pd
+from numba import njit
+
+COUNT_COLUMNS = ["total", "granted", "denied"]
+USER_COLUMNS = ["CarrierId", "CarrierFullName", "Identifier"]
 
 
 class TrafficAnalyzer:
     """Analyze traffic patterns from AEOS access event data."""
 
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame = None, summaries: dict = None):
+        """
+        Args:
+            df: Event DataFrame from `load_events`.
+            summaries: Optional per-key counts already aggregated by
+                `load_aggregates`, used instead of counting `df`.
+        """
         self.df = df
+        self._counts = summaries
+        self._counts_for = df
 
     def hourly_distribution(self) -> pd.DataFrame:
         """Events grouped by hour of day."""
-        granted_mask = self.df["Granted"] == True
-        grouped = self.df.groupby("Hour").agg(
-            total=("DateTime", "count"),
-            granted=("Granted", lambda x: x.eq(True).sum()),
-        ).reset_index()
+        grouped = self._summaries["hour"].copy()
         grouped["denied"] = grouped["total"] - grouped["granted"]
         grouped["grant_rate"] = (grouped["granted"] / grouped["total"] * 100).round(1)
         return grouped
 
     def daily_trend(self) -> pd.DataFrame:
         """Events grouped by date."""
-        grouped = self.df.groupby("Date").agg(
-            total=("DateTime", "count"),
-            granted=("Granted", lambda x: x.eq(True).sum()),
-        ).reset_index()
+        grouped = self._summaries["date"].copy()
         grouped["denied"] = grouped["total"] - grouped["granted"]
-        return grouped.sort_values("Date")
+        return grouped
 
     def top_access_points(self, n: int = 10) -> pd.DataFrame:
         """
         Most active access points (AEOS AccesspointName).
         """
         return (
-            self.df.groupby("AccesspointName")
-            .agg(
-                total=("DateTime", "count"),
-                granted=("Granted", lambda x: x.eq(True).sum()),
-            )
-            .reset_index()
+            self._summaries["access_point"]
             .assign(denied=lambda x: x["total"] - x["granted"])
             .sort_values("total", ascending=False)
             .head(n)
@@ -55,24 +59,150 @@ class TrafficAnalyzer:
         Most active badge holders (AEOS CarrierFullName + Identifier).
         """
         return (
-            self.df.groupby(["CarrierId", "CarrierFullName", "Identifier"])
-            .agg(
-                total=("DateTime", "count"),
-                denied=("Granted", lambda x: x.eq(False).sum()),
-            )
-            .reset_index()
+            self._summaries["user"]
+            .drop(columns="granted")
             .sort_values("total", ascending=False)
             .head(n)
         )
 
     def grant_deny_ratio(self) -> dict:
         """Overall granted vs denied ratio."""
-        total = len(self.df)
-        granted = int(self.df["Granted"].eq(True).sum())
-        denied = int(self.df["Granted"].eq(False).sum())
+        hours = self._summaries["hour"]
+        total = int(hours["total"].sum())
+        granted = int(hours["granted"].sum())
+        denied = int(hours["denied"].sum())
         return {
             "total": total,
             "granted": granted,
             "denied": denied,
             "grant_rate_pct": round(granted / total * 100, 2) if total else 0,
         }
+
+    @property
+    def _summaries(self) -> dict:
+        """
+        Per-key event counts, computed on first use.
+
+        Maps "hour", "date", "access_point" and "user" to a DataFrame of the
+        key column(s) plus total / granted / denied, where denied counts
+        "Access denied*" events only (alarm events are in total alone).
+        Rebuilt whenever `self.df` is replaced, or taken as is from the
+        `summaries` passed to the constructor.
+        """
+        if self._counts is None or self._counts_for is not self.df:
+            self._counts = self._count_events()
+            self._counts_for = self.df
+        return self._counts
+
+    def _count_events(self) -> dict:
+        df = self.df
+
+        granted = df["Granted"].to_numpy(dtype=np.int8, na_value=-1)
+        hours = df["Hour"].to_numpy().astype(np.int64)
+        days = df["DateHourKey"].to_numpy() // 24
+        first_day = days.min() if len(days) else 0
+        ap_codes, ap_names = _factorize(df["AccesspointName"])
+        user_codes, user_rows = _factorize_rows(df, USER_COLUMNS)
+
+        hour_counts, day_counts, ap_counts, user_counts = _count_by_key(
+            granted,
+            hours,
+            days - first_day,
+            ap_codes,
+            user_codes,
+            int(days.max() - first_day + 1) if len(days) else 0,
+            len(ap_names),
+            len(user_rows),
+        )
+
+        hour = np.flatnonzero(hour_counts[:, 0])
+        day = np.flatnonzero(day_counts[:, 0])
+        ap = np.flatnonzero(ap_counts[:, 0])
+        user = np.flatnonzero(user_counts[:, 0])
+
+        return {
+            "hour": _with_counts(pd.DataFrame({"Hour": hour}), hour_counts[hour]),
+            "date": _with_counts(
+                pd.DataFrame({"Date": (first_day + day).astype("datetime64[D]")}),
+                day_counts[day],
+            ),
+            "access_point": _with_counts(
+                pd.DataFrame({"AccesspointName": ap_names[ap]}), ap_counts[ap]
+            ),
+            "user": _with_counts(
+                df[USER_COLUMNS].iloc[user_rows[user]].reset_index(drop=True),
+                user_counts[user],
+            ),
+        }
+
+
+@njit(cache=True, nogil=True)
+def _count_by_key(granted, hours, days, aps, users, n_days, n_aps, n_users):
+    """
+    One pass over all events, counting total / granted / denied per key.
+
+    `granted` is 1, 0 or -1 (neither); key codes of -1 are skipped, like
+    missing keys in a groupby.
+    """
+    hour_counts = np.zeros((24, 3), dtype=np.int64)
+    day_counts = np.zeros((n_days, 3), dtype=np.int64)
+    ap_counts = np.zeros((n_aps, 3), dtype=np.int64)
+    user_counts = np.zeros((n_users, 3), dtype=np.int64)
+
+    for i in range(len(granted)):
+        # Column 1 counts granted events, column 2 denied ones
+        col = 1 if granted[i] == 1 else 2 if granted[i] == 0 else 0
+
+        hour_counts[hours[i], 0] += 1
+        day_counts[days[i], 0] += 1
+        if col:
+            hour_counts[hours[i], col] += 1
+            day_counts[days[i], col] += 1
+        if aps[i] >= 0:
+            ap_counts[aps[i], 0] += 1
+            if col:
+                ap_counts[aps[i], col] += 1
+        if users[i] >= 0:
+            user_counts[users[i], 0] += 1
+            if col:
+                user_counts[users[i], col] += 1
+
+    return hour_counts, day_counts, ap_counts, user_counts
+
+
+def _factorize(values: pd.Series) -> tuple:
+    """Return (codes, uniques); missing values get code -1."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories.to_numpy()
+    codes, uniques = pd.factorize(values)
+    return codes, np.asarray(uniques)
+
+
+def _factorize_rows(df: pd.DataFrame, columns: list) -> tuple:
+    """
+    Codes for each distinct combination of `columns`.
+
+    Returns (codes, rows): rows with a missing value in any column get code
+    -1, and `rows[code]` is the position of one event with that combination.
+    """
+    key = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+    for col in columns:
+        codes, uniques = _factorize(df[col])
+        key = key * (len(uniques) + 1) + codes
+        valid &= codes >= 0
+
+    codes = np.full(len(df), -1, dtype=np.int64)
+    codes[valid], uniques = pd.factorize(key[valid])
+
+    positions = np.flatnonzero(valid)
+    rows = np.empty(len(uniques), dtype=np.int64)
+    rows[codes[valid][::-1]] = positions[::-1]
+    return codes, rows
+
+
+def _with_counts(keys: pd.DataFrame, counts: np.ndarray) -> pd.DataFrame:
+    """Append the total / granted / denied count columns to `keys`."""
+    for i, col in enumerate(COUNT_COLUMNS):
+        keys[col] = counts[:, i]
+    return keys
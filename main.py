@@ -14,11 +14,17 @@ import argparse
 import logging
 import os
 import sys
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from dotenv import load_dotenv
 
-from analyzers.data_loader import load_events
+from analyzers.data_loader import (
+    load_aggregates,
+    load_cached_events,
+    load_events,
+    load_hourly_counts,
+)
 from analyzers.traffic import TrafficAnalyzer
 from analyzers.anomaly import AnomalyDetector
 from analyzers.tailgate import TailgateAnalyzer
@@ -33,6 +39,108 @@ logging.basicConfig(
 logger = logging.getLogger("access-log-analyzer")
 
 
+def run_traffic(df, summaries: dict = None) -> dict:
+    """Traffic patterns: hourly/daily volumes, top doors and users, grant rate."""
+    logger.info("Running traffic analysis...")
+    traffic = TrafficAnalyzer(df, summaries=summaries)
+    return {
+        "hourly_stats": traffic.hourly_distribution(),
+        "daily_stats": traffic.daily_trend(),
+        "top_doors": traffic.top_access_points(n=15),
+        "top_users": traffic.top_users(n=20),
+        "grant_rate": traffic.grant_deny_ratio(),
+    }
+
+
+def run_anomaly(df, threshold: float, window: int = None) -> dict:
+    """Hourly volume, per-user and off-hours anomaly detection."""
+    logger.info("Running anomaly detection (threshold=%.1f)...", threshold)
+    detector = AnomalyDetector(df, z_threshold=threshold)
+    hourly_anomalies, user_anomalies, off_hours = detector.detect_all(window=window)
+    logger.info("Found %d hourly anomalies, %d user anomalies, %d off-hours events",
+                len(hourly_anomalies), len(user_anomalies), len(off_hours))
+    return {
+        "hourly_anomalies": hourly_anomalies,
+        "user_anomalies": user_anomalies,
+        "off_hours_access": off_hours,
+    }
+
+
+def run_tailgate(df) -> dict:
+    """Tailgate / rapid follow analysis."""
+    logger.info("Running tailgate analysis...")
+    tailgate = TailgateAnalyzer(df)
+    rapid_follows = tailgate.detect_rapid_follows(max_seconds=3)
+    logger.info("Found %d potential tailgating events", len(rapid_follows))
+    return {"rapid_follows": rapid_follows}
+
+
+def analyze_events(args) -> dict:
+    """Load the raw events and run every analysis stage on them."""
+    # 1. Load data from SQL Server, or today's cached snapshot of it
+    if args.no_cache:
+        df = load_events(days=args.days)
+    else:
+        df = load_cached_events(days=args.days, refresh=args.refresh_cache)
+    logger.info("Loaded %d events (%.1f MB in memory)",
+                len(df), df.memory_usage(deep=True).sum() / 1e6)
+
+    if df.empty:
+        logger.warning("No events found. Exiting.")
+        sys.exit(0)
+
+    # 2-4. Traffic, anomaly and tailgate analysis. The stages only read `df`,
+    # so they run side by side in threads sharing the one DataFrame; pandas
+    # and the numba kernels release the GIL for the heavy lifting. Tailgate
+    # stays on the main thread: its kernel is itself parallel, and numba's
+    # thread pools should only be launched from one thread.
+    results = {
+        "period_days": args.days,
+        "total_events": len(df),
+    }
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(run_traffic, df),
+            executor.submit(run_anomaly, df, args.threshold, args.window),
+        ]
+        results.update(run_tailgate(df))
+        for future in as_completed(futures):
+            results.update(future.result())
+    return results
+
+
+def analyze_aggregated(args) -> dict:
+    """
+    Traffic report and hourly anomalies from counts aggregated in SQL Server.
+
+    No raw events are transferred, so the per-user, off-hours and tailgate
+    analyses, which need them, are skipped.
+    """
+    logger.info("Loading aggregated counts from SQL Server...")
+    summaries = load_aggregates(days=args.days)
+    hourly_counts = load_hourly_counts(days=args.days)
+    total_events = int(summaries["hour"]["total"].sum())
+    logger.info("Loaded aggregates for %d events", total_events)
+
+    if total_events == 0:
+        logger.warning("No events found. Exiting.")
+        sys.exit(0)
+
+    results = {
+        "period_days": args.days,
+        "total_events": total_events,
+        # Listed in the report so absent sections don't read as "nothing found"
+        "skipped": ["user anomalies", "off-hours access", "tailgating"],
+    }
+    results.update(run_traffic(None, summaries=summaries))
+
+    logger.info("Running hourly anomaly detection (threshold=%.1f)...", args.threshold)
+    detector = AnomalyDetector(None, z_threshold=args.threshold, hourly_counts=hourly_counts)
+    results["hourly_anomalies"] = detector.detect_hourly_anomalies(window=args.window)
+    logger.info("Found %d hourly anomalies", len(results["hourly_anomalies"]))
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="AEOS Access Log Analyzer — Security analytics and anomaly detection"
@@ -41,71 +149,38 @@ def main():
     parser.add_argument("--output", default="reports", help="Output directory for reports (default: reports/)")
     parser.add_argument("--format", choices=["html", "csv", "both"], default="both", help="Report format")
     parser.add_argument("--threshold", type=float, default=2.0, help="Anomaly detection Z-score threshold (default: 2.0)")
+    parser.add_argument("--window", type=int, default=None, help="Rolling window in hours for hourly anomaly Z-scores (default: whole period)")
+    parser.add_argument("--no-cache", action="store_true", help="Always query SQL Server, bypassing the local Parquet cache")
+    parser.add_argument("--refresh-cache", action="store_true", help="Re-query SQL Server and overwrite today's cached events")
+    parser.add_argument("--aggregated", action="store_true", help="Aggregate in SQL Server: traffic report and hourly anomalies only, no raw events transferred")
     args = parser.parse_args()
 
     os.makedirs(args.output, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
 
     logger.info("=== AEOS Access Log Analyzer ===")
     logger.info("Period: last %d days", args.days)
     logger.info("Output: %s", args.output)
 
-    # 1. Load data from SQL Server
-    logger.info("Loading access events from SQL Server...")
-    df = load_events(days=args.days)
-    logger.info("Loaded %d events", len(df))
-
-    if df.empty:
-        logger.warning("No events found. Exiting.")
-        sys.exit(0)
-
-    # 2. Traffic analysis
-    logger.info("Running traffic analysis...")
-    traffic = TrafficAnalyzer(df)
-    hourly_stats = traffic.hourly_distribution()
-    daily_stats = traffic.daily_trend()
-    top_doors = traffic.top_access_points(n=15)
-    top_users = traffic.top_users(n=20)
-    grant_rate = traffic.grant_deny_ratio()
-
-    # 3. Anomaly detection
-    logger.info("Running anomaly detection (threshold=%.1f)...", args.threshold)
-    detector = AnomalyDetector(df, z_threshold=args.threshold)
-    hourly_anomalies = detector.detect_hourly_anomalies()
-    user_anomalies = detector.detect_user_anomalies()
-    off_hours = detector.detect_off_hours_access()
-    logger.info("Found %d hourly anomalies, %d user anomalies, %d off-hours events",
-                len(hourly_anomalies), len(user_anomalies), len(off_hours))
-
-    # 4. Tailgate / rapid follow analysis
-    logger.info("Running tailgate analysis...")
-    tailgate = TailgateAnalyzer(df)
-    rapid_follows = tailgate.detect_rapid_follows(max_seconds=3)
-    logger.info("Found %d potential tailgating events", len(rapid_follows))
+    if args.aggregated:
+        results = analyze_aggregated(args)
+    else:
+        results = analyze_events(args)
 
     # 5. Generate reports
     logger.info("Generating reports...")
     generator = ReportGenerator(output_dir=args.output, timestamp=timestamp)
 
-    results = {
-        "period_days": args.days,
-        "total_events": len(df),
-        "hourly_stats": hourly_stats,
-        "daily_stats": daily_stats,
-        "top_doors": top_doors,
-        "top_users": top_users,
-        "grant_rate": grant_rate,
-        "hourly_anomalies": hourly_anomalies,
-        "user_anomalies": user_anomalies,
-        "off_hours_access": off_hours,
-        "rapid_follows": rapid_follows,
-    }
-
+    # The CSV and HTML writers are independent, mostly I/O and pyarrow work,
+    # so with --format both they run in parallel.
+    writers = []
     if args.format in ("csv", "both"):
-        generator.to_csv(results)
-
+        writers.append(generator.to_csv)
     if args.format in ("html", "both"):
-        generator.to_html(results)
+        writers.append(generator.to_html)
+    with ThreadPoolExecutor(max_workers=len(writers)) as executor:
+        for future in [executor.submit(write, results) for write in writers]:
+            future.result()
 
     logger.info("=== Analysis complete ===")
 